@@ -1,9 +1,84 @@
 import streamlit as st
 import fitz  # PyMuPDF
 import io
+import re
 import os
+import concurrent.futures
+import functools
+import tempfile
+import threading
+import numpy as _np
 from PIL import Image
-import gc
+
+# One reusable BytesIO per encoder thread - the encode path runs hundreds
+# of times per compression, so recycling buffers avoids churning the
+# allocator, and thread-local ownership makes the reuse lock-free
+_thread_state = threading.local()
+
+# Silence MuPDF's per-object stderr chatter - corrupt PDFs can emit
+# thousands of lines, and the writes are pure overhead in a web app.
+# The store itself cannot be capped at runtime in current PyMuPDF, so
+# memory is bounded by the explicit store_shrink calls along the
+# pipeline instead.
+fitz.TOOLS.mupdf_display_errors(False)
+
+# Watermark content-stream patterns, compiled once at import -
+# remove_watermark runs them against every page of every document.
+# Bytes patterns: content streams are byte strings and the old
+# latin-1 decode/encode round-trip only duplicated multi-MB buffers.
+_WM_PATTERNS = [
+    # Transparency with middle positioning
+    re.compile(rb'/GS\d+\s+gs\s+q\s+[\d\.\s]*[3-7]\d+[\d\.\s]*cm', re.DOTALL),
+    # Middle area transformations
+    re.compile(rb'q\s+[\d\.\s]*[3-7]\d+[\d\.\s]*cm\s+/GS\d+\s+gs.*?Q', re.DOTALL),
+]
+
+# One process-lifetime encoder pool - spinning up a fresh executor for
+# every quality tier costs thread creation/teardown ~25 times per search
+_executor = None
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() or 4)
+    return _executor
+
+def _get_buf():
+    buf = getattr(_thread_state, 'buf', None)
+    if buf is None:
+        buf = _thread_state.buf = io.BytesIO()
+    buf.seek(0)
+    buf.truncate(0)
+    return buf
+
+# PyTurboJPEG (libjpeg-turbo) is much faster than Pillow's JPEG codec.
+# It needs the libturbojpeg system library, so fall back to Pillow when
+# it is not available.
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJFLAG_FASTDCT
+    _turbo = TurboJPEG()
+except Exception:
+    _turbo = None
+
+def encode_jpeg(pil_image, quality):
+    """Encode an RGB PIL image to JPEG bytes, using libjpeg-turbo when available"""
+    if _turbo is not None:
+        try:
+            return _turbo.encode(_np.asarray(pil_image), quality=quality,
+                                 pixel_format=TJPF_RGB, flags=TJFLAG_FASTDCT)
+        except Exception:
+            pass
+    img_buffer = _get_buf()
+    # Force 4:2:0 chroma subsampling. From medium quality up, progressive
+    # scan ordering plus optimized Huffman tables trims another 5-15% at
+    # identical quality; below that the extra encoder passes cost more
+    # than the handful of bytes they save on already-tiny outputs
+    save_kwargs = {'format': 'JPEG', 'quality': quality, 'subsampling': 2}
+    if quality >= 30:
+        save_kwargs['progressive'] = True
+        save_kwargs['optimize'] = True
+    pil_image.save(img_buffer, **save_kwargs)
+    return img_buffer.getvalue()
 
 def remove_watermark(pdf_document):
     """Remove only center/middle watermarks, preserve footer stamps and official markings"""
@@ -13,25 +88,20 @@ def remove_watermark(pdf_document):
             page_rect = page.rect
             page_height = page_rect.height
             page_width = page_rect.width
-            
-            # Define regions: only remove watermarks from middle 60% of page
-            middle_start_y = page_height * 0.2  # Top 20% preserved
-            middle_end_y = page_height * 0.8    # Bottom 20% preserved (footer area)
-            middle_start_x = page_width * 0.2   # Left 20% preserved
-            middle_end_x = page_width * 0.8     # Right 20% preserved
-            
+
+            # Middle 60% of the page: top/bottom and left/right 20% bands
+            # (headers, footers, margins) are preserved. One rect, checked
+            # with contains() by all three loops below.
+            middle = fitz.Rect(page_width * 0.2, page_height * 0.2,
+                               page_width * 0.8, page_height * 0.8)
+
             # Step 1: Remove annotations only from middle area
             annot_list = list(page.annots())
             for annot in annot_list:
                 try:
-                    annot_rect = annot.rect
-                    annot_center_x = (annot_rect.x0 + annot_rect.x1) / 2
-                    annot_center_y = (annot_rect.y0 + annot_rect.y1) / 2
-                    
                     # Only remove if annotation is in middle area (not in footer/header)
-                    if (middle_start_x <= annot_center_x <= middle_end_x and 
-                        middle_start_y <= annot_center_y <= middle_end_y):
-                        
+                    if middle.contains((annot.rect.tl + annot.rect.br) / 2):
+
                         annot_type = annot.type[0] if annot.type else -1
                         if annot_type in [0, 1, 2, 3, 8, 13, 14, 15, 16]:
                             page.delete_annot(annot)
@@ -40,29 +110,27 @@ def remove_watermark(pdf_document):
             
             # Step 2: Remove watermark images only from middle area
             try:
-                image_list = page.get_images(full=True)
-                for img_index, img in enumerate(image_list):
+                # One content-stream scan for all placements - the old
+                # per-xref get_image_rects calls re-parsed the page's
+                # content stream once per image
+                rects_by_xref = {}
+                for info in page.get_image_info(xrefs=True):
+                    if info.get("xref"):
+                        rects_by_xref.setdefault(info["xref"], []).append(
+                            fitz.Rect(info["bbox"]))
+                for xref, image_rects in rects_by_xref.items():
                     try:
-                        xref = img[0]
-                        
-                        # Get image rectangles to check position
-                        image_rects = page.get_image_rects(xref)
-                        if image_rects:
-                            for img_rect in image_rects:
-                                img_center_x = (img_rect.x0 + img_rect.x1) / 2
-                                img_center_y = (img_rect.y0 + img_rect.y1) / 2
-                                
-                                # Only remove if image is in middle area
-                                if (middle_start_x <= img_center_x <= middle_end_x and 
-                                    middle_start_y <= img_center_y <= middle_end_y):
-                                    
-                                    pix = fitz.Pixmap(pdf_document, xref)
-                                    if pix:
-                                        # Check if it's likely a watermark (small, transparent)
-                                        if (pix.width < 200 and pix.height < 200) or pix.alpha > 0:
-                                            page.delete_image(xref)
-                                        pix = None
-                                    break  # Only check first occurrence
+                        for img_rect in image_rects:
+                            # Only remove if image is in middle area
+                            if middle.contains((img_rect.tl + img_rect.br) / 2):
+                                pix = fitz.Pixmap(pdf_document, xref)
+                                try:
+                                    # Check if it's likely a watermark (small, transparent)
+                                    if (pix.width < 200 and pix.height < 200) or pix.alpha > 0:
+                                        page.delete_image(xref)
+                                finally:
+                                    pix = None
+                                break  # Only check first occurrence
                     except Exception:
                         continue
             except Exception:
@@ -73,25 +141,17 @@ def remove_watermark(pdf_document):
                 if page.get_contents():
                     content_stream = page.read_contents()
                     if content_stream:
-                        content_str = content_stream.decode('latin-1', errors='ignore')
-                        
-                        # More conservative pattern removal - avoid footer area
-                        import re
-                        
-                        # Only remove transparency operations that are likely in middle area
-                        # Look for patterns that include positioning in middle area
-                        watermark_patterns = [
-                            r'/GS\d+\s+gs\s+q\s+[\d\.\s]*[3-7]\d+[\d\.\s]*cm',  # Transparency with middle positioning
-                            r'q\s+[\d\.\s]*[3-7]\d+[\d\.\s]*cm\s+/GS\d+\s+gs.*?Q',  # Middle area transformations
-                        ]
-                        
-                        for pattern in watermark_patterns:
-                            content_str = re.sub(pattern, '', content_str, flags=re.DOTALL)
-                        
-                        try:
-                            page.set_contents(content_str.encode('latin-1'))
-                        except Exception:
-                            pass
+                        # Conservative removal: only transparency operations
+                        # positioned in the middle area, nothing near footers
+                        cleaned = content_stream
+                        for pattern in _WM_PATTERNS:
+                            cleaned = pattern.sub(b'', cleaned)
+
+                        if cleaned != content_stream:
+                            try:
+                                page.set_contents(cleaned)
+                            except Exception:
+                                pass
                     
                     # Clean contents but preserve structure
                     page.clean_contents()
@@ -104,14 +164,9 @@ def remove_watermark(pdf_document):
                 widgets = page.widgets()
                 for widget in widgets:
                     try:
-                        widget_rect = widget.rect
-                        widget_center_x = (widget_rect.x0 + widget_rect.x1) / 2
-                        widget_center_y = (widget_rect.y0 + widget_rect.y1) / 2
-                        
                         # Only remove widgets in middle area
-                        if (middle_start_x <= widget_center_x <= middle_end_x and 
-                            middle_start_y <= widget_center_y <= middle_end_y):
-                            
+                        if middle.contains((widget.rect.tl + widget.rect.br) / 2):
+
                             if widget.field_type_string in ['Text', 'Button']:
                                 widget.delete()
                     except Exception:
@@ -125,270 +180,794 @@ def remove_watermark(pdf_document):
     
     return pdf_document
 
-def compress_pdf_to_100kb(input_pdf_bytes):
+# Streamlit reruns the whole script on every widget interaction; caching on
+# the input bytes hash makes those reruns (and re-uploads of the same file)
+# free instead of repeating a multi-second compression
+@st.cache_data(show_spinner=False, max_entries=8, ttl=3600)
+def compress_pdf_to_100kb(input_pdf_bytes, _progress=None):
     """
     Compress PDF to strictly between 80KB-100KB using iterative binary search approach
+
+    Returns (compressed_bytes_or_None, error_message_or_None). Results are
+    cached on the input bytes, so re-running the script on the same upload
+    (any widget interaction reruns it) skips the whole pipeline. _progress
+    is an optional (percent, message) callback driven by real stage
+    completions; the leading underscore keeps it out of the cache key.
     """
     max_size = 100 * 1024  # 100KB in bytes
     min_size = 80 * 1024   # 80KB in bytes
-    
+
+    def report(percent, message):
+        if _progress is not None:
+            try:
+                _progress(percent, message)
+            except Exception:
+                pass
+
+    # Already under the limit - nothing to do
+    if len(input_pdf_bytes) <= max_size:
+        return input_pdf_bytes, None
+
     try:
         pdf_document = fitz.open(stream=input_pdf_bytes, filetype="pdf")
-        
-        # Step 1: Remove watermarks
-        pdf_document = remove_watermark(pdf_document)
-        
-        # Step 2: Try simple compression first
-        compressed_bytes = simple_compress(pdf_document)
-        
-        # Check if already in target range
-        if min_size <= len(compressed_bytes) <= max_size:
+        # MuPDF copied the stream into its own buffer; dropping our reference
+        # now keeps peak memory at one input-sized copy instead of two for
+        # the rest of the pipeline (the caller may release its copy too)
+        input_pdf_bytes = None
+
+        try:
+            # Step 1: Remove watermarks
+            report(25, "🧹 Removing watermarks...")
+            pdf_document = remove_watermark(pdf_document)
+
+            # Step 2: Serialize once - this cleaned-up stream is the base for
+            # all further compression attempts, so no stage has to
+            # re-serialize the doc
+            report(50, "📐 Optimizing document structure...")
+            base_bytes = simple_compress(pdf_document)
+        finally:
+            # Deterministic release of MuPDF's input-sized C buffer even
+            # when a stage raises - the outer handler would otherwise keep
+            # it alive until collection
             pdf_document.close()
-            return compressed_bytes
-        
+
+        # Image recompression can only shrink the file further, so once the
+        # cleanup pass is under the limit there is nothing left to gain
+        if len(base_bytes) <= max_size:
+            return base_bytes, None
+
         # Step 3: Use binary search approach for precise size control
-        result_bytes = binary_search_compression(pdf_document, min_size, max_size)
-        
-        pdf_document.close()
-        return result_bytes
-        
+        report(75, "🖼️ Compressing images...")
+        result_bytes = rewrite_images_compression(base_bytes, min_size, max_size)
+        if result_bytes is None:
+            result_bytes = binary_search_compression(base_bytes, min_size, max_size)
+        # Refcounting reclaims the trial buffers as they go out of scope; the
+        # one cache that outlives them is MuPDF's internal store, so trim
+        # that directly instead of paying for a full generational GC sweep
+        fitz.TOOLS.store_shrink(100)
+        return result_bytes, None
+
     except Exception as e:
-        st.error(f"Compression failed: {str(e)}")
-        return None
+        return None, f"Compression failed: {str(e)}"
 
 def simple_compress(pdf_document):
     """
     Simple compression without any problematic operations
     """
     try:
+        # For very large documents, let MuPDF stream the result to disk
+        # instead of allocating another input-sized bytes object next to
+        # the input still held in memory
+        if _estimate_size(pdf_document) > 50 * 1024 * 1024:
+            fd, tmp_path = tempfile.mkstemp(suffix=".pdf")
+            os.close(fd)
+            try:
+                pdf_document.save(tmp_path, garbage=4, deflate=True,
+                                  deflate_images=True, deflate_fonts=True, clean=True,
+                                  use_objstms=True, compression_effort=100)
+                with open(tmp_path, "rb") as tmp_file:
+                    return tmp_file.read()
+            finally:
+                os.unlink(tmp_path)
+
         # Use garbage collection and basic compression
-        pdf_document.save(garbage=3, deflate=True)
-        return pdf_document.tobytes(garbage=3, deflate=True)
+        return pdf_document.tobytes(garbage=4, deflate=True, deflate_images=True,
+                                    deflate_fonts=True, clean=True, linear=False,
+                                    use_objstms=True, compression_effort=100)
     except Exception:
         return pdf_document.tobytes()
 
-def binary_search_compression(pdf_document, min_size, max_size):
+def rewrite_images_compression(base_bytes, min_size, max_size):
+    """
+    Try MuPDF's native image rewriting first (PyMuPDF >= 1.24). It iterates
+    the xrefs in C without any Python-side pixmap work, so when one of its
+    dpi/quality rungs lands in range it beats the PIL pipeline by a wide
+    margin. Returns bytes in the target range, or None to fall back.
+    """
+    if not hasattr(fitz.Document, "rewrite_images"):
+        return None
+    try:
+        doc = fitz.open(stream=base_bytes, filetype="pdf")
+    except Exception:
+        return None
+    try:
+        try:
+            # Needs the optional fontTools package - skip quietly without it
+            doc.subset_fonts()
+        except Exception:
+            pass
+
+        # dpi_target must sit below dpi_threshold, so each rung resamples
+        # anything above the threshold down to ~80% of it
+        for dpi, target, quality in [(150, 120, 70), (100, 80, 50),
+                                     (72, 60, 35), (60, 48, 20)]:
+            try:
+                doc.rewrite_images(dpi_threshold=dpi, dpi_target=target, quality=quality)
+            except Exception:
+                return None
+            data = doc.tobytes(garbage=3, deflate=True, clean=True, use_objstms=True)
+            if min_size <= len(data) <= max_size:
+                return data
+            if len(data) < min_size:
+                # Overshot the range - the PIL search can steer more finely
+                return None
+            # Keep MuPDF's internal store from ballooning across rungs
+            fitz.TOOLS.store_shrink(100)
+        return None
+    except Exception:
+        return None
+    finally:
+        doc.close()
+
+def binary_search_compression(base_bytes, min_size, max_size):
     """
     Use binary search to find optimal compression settings for exact size range
     """
     # Quality levels for binary search (from high to low quality)
     quality_range = list(range(5, 95, 5))  # [5, 10, 15, ..., 90]
-    dimension_range = list(range(100, 1200, 50))  # [100, 150, 200, ..., 1150]
-    
+
     best_result = None
     best_size = float('inf')
-    
-    # Try different combinations with binary search approach
-    for max_dim in [800, 600, 400, 300, 200]:
-        low_quality, high_quality = 0, len(quality_range) - 1
-        
-        while low_quality <= high_quality:
-            mid = (low_quality + high_quality) // 2
-            quality = quality_range[mid]
-            
+
+    # One working document for the whole search: every trial re-encodes the
+    # cached original images in place, so the base bytes are parsed once
+    # instead of once per trial
+    work_doc = fitz.open(stream=base_bytes, filetype="pdf")
+    try:
+        sources = collect_image_sources(work_doc)
+        # Snapshotting decoded every image once - drop MuPDF's cached
+        # copies now so the store does not hold a second decoded set
+        # of every image through the whole search
+        fitz.TOOLS.store_shrink(100)
+
+        # If every image vanished outright the file would still be over the
+        # ceiling, the fine-grained search cannot succeed - hand such
+        # documents straight to the aggressive pass, whose rewrites also
+        # let the serializer drop image-attached weight (ICC profiles,
+        # soft masks) the stream sums below count as irreducible. Walk all
+        # /Image xrefs rather than the snapshots: an image the loader
+        # could not handle is still image weight, not text
+        image_bytes = 0
+        for xref in range(1, work_doc.xref_length()):
             try:
-                compressed_bytes = compress_with_settings(pdf_document, quality, max_dim)
-                current_size = len(compressed_bytes)
-                
-                # Perfect range - return immediately
-                if min_size <= current_size <= max_size:
-                    return compressed_bytes
-                
-                # Track best result (closest to target range)
-                if abs(current_size - ((min_size + max_size) // 2)) < abs(best_size - ((min_size + max_size) // 2)):
-                    best_result = compressed_bytes
-                    best_size = current_size
-                
-                # Adjust search range
-                if current_size > max_size:
-                    # File too large, need more compression (lower quality)
-                    high_quality = mid - 1
-                elif current_size < min_size:
-                    # File too small, need less compression (higher quality)
-                    low_quality = mid + 1
-                
+                if work_doc.xref_get_key(xref, "Subtype")[1] == "/Image":
+                    image_bytes += int(work_doc.xref_get_key(xref, "Length")[1])
             except Exception:
-                # Skip this setting and continue
-                high_quality = mid - 1
-    
+                continue
+        if len(base_bytes) - image_bytes > max_size:
+            return force_into_range(base_bytes, min_size, max_size)
+
+        modified = set()
+        # (quality, max_dim) -> size for every completed trial. JPEG output
+        # size is monotonic in both knobs, so earlier trials can bound later
+        # ones: anything at least as aggressive as an undershooting trial
+        # will undershoot too, and vice versa for overshoots.
+        trial_sizes = {}
+        # An even share of the target per image - anything already below
+        # this cannot meaningfully shrink the file further
+        per_image_budget = max(max_size // max(len(sources), 1), 4096)
+
+        # Try different combinations with binary search approach
+        for max_dim in [800, 600, 400, 300, 200]:
+            low_quality, high_quality = 0, len(quality_range) - 1
+
+            # Seed the first probe from a byte-budget model instead of the
+            # fixed midpoint: JPEG output is roughly proportional to pixel
+            # count with a quality-dependent factor, so the quality whose
+            # expected size lands near max_size is a far better opener and
+            # typically saves 1-2 full trials per dimension
+            scaled_pixels = 0
+            for source in sources.values():
+                w, h = source['width'], source['height']
+                if w > max_dim or h > max_dim:
+                    w, h = _fit_size(w, h, max_dim)
+                scaled_pixels += w * h
+            seed = None
+            if scaled_pixels:
+                guess = int((max_size / (0.15 * scaled_pixels)) ** 0.5 * 100)
+                seed = min(range(len(quality_range)),
+                           key=lambda i: abs(quality_range[i] - guess))
+
+            while low_quality <= high_quality:
+                if seed is not None:
+                    mid = min(max(seed, low_quality), high_quality)
+                    seed = None
+                else:
+                    mid = (low_quality + high_quality) // 2
+                quality = quality_range[mid]
+
+                # Prune trials whose outcome is already decided by the curve
+                predicted = None
+                for (q, d), size in trial_sizes.items():
+                    if size < min_size and quality <= q and max_dim <= d:
+                        predicted = 'small'
+                        break
+                    if size > max_size and quality >= q and max_dim >= d:
+                        predicted = 'large'
+                        break
+                if predicted == 'small':
+                    low_quality = mid + 1
+                    continue
+                if predicted == 'large':
+                    high_quality = mid - 1
+                    continue
+
+                try:
+                    changed = apply_quality_tier(work_doc, sources, quality, max_dim, modified,
+                                                 per_image_budget=per_image_budget,
+                                                 target_size=max_size)
+                    if changed or modified:
+                        compressed_bytes = _serialize_working(work_doc)
+                    else:
+                        compressed_bytes = base_bytes
+                    current_size = len(compressed_bytes)
+                    trial_sizes[(quality, max_dim)] = current_size
+
+                    # Perfect range - return immediately
+                    if min_size <= current_size <= max_size:
+                        return _repack_candidate(compressed_bytes, min_size)
+
+                    # Track best result (closest to target range)
+                    if abs(current_size - ((min_size + max_size) // 2)) < abs(best_size - ((min_size + max_size) // 2)):
+                        best_result = compressed_bytes
+                        best_size = current_size
+
+                    # Adjust search range
+                    if current_size > max_size:
+                        # File too large, need more compression (lower quality)
+                        high_quality = mid - 1
+                    elif current_size < min_size:
+                        # File too small, need less compression (higher quality)
+                        low_quality = mid + 1
+
+                except Exception:
+                    # Skip this setting and continue
+                    high_quality = mid - 1
+    finally:
+        work_doc.close()
+
     # If we found something in range, return it
     if best_result and min_size <= best_size <= max_size:
-        return best_result
+        return _repack_candidate(best_result, min_size)
     
     # Final attempt with aggressive compression to force into range
-    return force_into_range(pdf_document, min_size, max_size)
+    return force_into_range(base_bytes, min_size, max_size)
 
-def compress_with_settings(pdf_document, quality, max_dimension):
+def _estimate_size(doc):
     """
-    Compress PDF with specific quality and dimension settings
+    Cheap size estimate from the xref table's stream lengths - integer
+    arithmetic only, no decompression and no serialization
     """
-    temp_bytes = pdf_document.tobytes()
-    temp_doc = fitz.open(stream=temp_bytes, filetype="pdf")
-    
-    # Process each page
-    for page_num in range(len(temp_doc)):
-        page = temp_doc[page_num]
-        image_list = page.get_images(full=True)
-        
-        for img in image_list:
+    total = 0
+    for xref in range(1, doc.xref_length()):
+        try:
+            if doc.xref_is_stream(xref):
+                length = doc.xref_get_key(xref, "Length")[1]
+                total += int(length)
+        except Exception:
+            continue
+    return total
+
+# Decoded-sample snapshots are the fastest to re-encode but huge - a long
+# Flate-compressed scan can decode to hundreds of MB held for the whole
+# search. Past this budget snapshots keep encoded bytes instead and pay a
+# per-tier decode in the worker.
+_RAW_SNAPSHOT_BUDGET = 64 << 20
+
+def _load_image_source(doc, xref, raw_allowance=None):
+    """
+    Snapshot one image xref's original bytes (MuPDF access, main thread
+    only). Returns None for images too small to bother with. raw_allowance
+    caps how many decoded sample bytes this snapshot may hold; beyond it
+    the snapshot stores encoded bytes instead.
+    """
+    # The dimensions sit in the xref dictionary - rule out tiny images
+    # from there before decoding or allocating anything
+    try:
+        width = int(doc.xref_get_key(xref, "Width")[1])
+        height = int(doc.xref_get_key(xref, "Height")[1])
+        if width * height < 5000:
+            return None
+    except Exception:
+        pass
+
+    base_image = None
+    try:
+        base_image = doc.extract_image(xref)
+    except Exception:
+        pass
+
+    # Formats PIL cannot decode (JBIG2, JPEG2000) go through the Pixmap
+    # fallback, which renders them via MuPDF instead of raising
+    if base_image and base_image.get("ext") in ("jb2", "jpx", "jp2"):
+        base_image = None
+
+    if base_image and base_image.get("ext") in ("jpeg", "jpg"):
+        # Skip very small images
+        if base_image["width"] * base_image["height"] < 5000:
+            return None
+        # Snapshot the dictionary entries _apply_image stamps over, so a
+        # restored original gets its real metadata back - a grayscale or
+        # CMYK JPEG must not come back tagged /DeviceRGB
+        meta = {}
+        for key in _IMAGE_DICT_KEYS:
+            key_type, value = doc.xref_get_key(xref, key)
+            if key_type != "null":
+                meta[key] = value
+        return {'data': base_image["image"], 'ext': 'jpeg',
+                'width': base_image["width"], 'height': base_image["height"],
+                'meta': meta}
+
+    # Pixmaps own large C-side sample buffers (tens of MB for a 300-DPI
+    # page image) and have no close(); dropping the reference in a finally
+    # frees them promptly on every exit path, exceptions included
+    pix = fitz.Pixmap(doc, xref)
+    try:
+        # Skip very small images
+        if pix.width * pix.height < 5000:
+            return None
+
+        # Over the decoded-snapshot budget: keep an encoded copy and let
+        # each tier decode it on demand rather than pinning the samples
+        # in memory for the lifetime of the search
+        if raw_allowance is not None and pix.stride * pix.height > raw_allowance:
+            if base_image and base_image.get("ext") == "png":
+                return {'data': base_image["image"], 'ext': 'png',
+                        'width': base_image["width"],
+                        'height': base_image["height"]}
+            enc = pix if pix.n - pix.alpha in (1, 3) else fitz.Pixmap(fitz.csRGB, pix)
             try:
-                xref = img[0]
-                pix = fitz.Pixmap(temp_doc, xref)
-                
-                # Skip very small images
-                if pix.width * pix.height < 5000:
-                    pix = None
-                    continue
-                
-                # Convert to PIL Image
-                if pix.n - pix.alpha < 4:
-                    img_data = pix.tobytes("png")
-                    pil_image = Image.open(io.BytesIO(img_data))
-                else:
-                    pix1 = fitz.Pixmap(fitz.csRGB, pix)
-                    img_data = pix1.tobytes("png")
-                    pil_image = Image.open(io.BytesIO(img_data))
-                    pix1 = None
-                
-                pix = None
-                
-                # Resize maintaining aspect ratio
-                original_size = pil_image.size
-                if original_size[0] > max_dimension or original_size[1] > max_dimension:
-                    ratio = min(max_dimension / original_size[0], max_dimension / original_size[1])
-                    new_size = (int(original_size[0] * ratio), int(original_size[1] * ratio))
-                    pil_image = pil_image.resize(new_size, Image.Resampling.LANCZOS)
-                
-                # Handle transparency
-                if pil_image.mode in ('RGBA', 'LA'):
-                    background = Image.new('RGB', pil_image.size, (255, 255, 255))
-                    if pil_image.mode == 'RGBA':
-                        background.paste(pil_image, mask=pil_image.split()[-1])
-                    else:
-                        background.paste(pil_image, mask=pil_image.split()[-1])
-                    pil_image = background
-                
-                if pil_image.mode != 'RGB':
-                    pil_image = pil_image.convert('RGB')
-                
-                # Compress image
-                img_buffer = io.BytesIO()
-                pil_image.save(img_buffer, format='JPEG', quality=quality, optimize=True)
-                compressed_image_data = img_buffer.getvalue()
-                
-                # Replace image
-                image_rects = page.get_image_rects(xref)
-                if image_rects:
-                    page.delete_image(xref)
-                    for rect in image_rects:
-                        page.insert_image(rect, stream=compressed_image_data, keep_proportion=True)
-                
+                return {'data': enc.tobytes("png"), 'ext': 'png',
+                        'width': enc.width, 'height': enc.height}
+            finally:
+                enc = None
+
+        base_n = pix.n - pix.alpha
+        if base_n in (1, 3):
+            # Hand the raw samples straight to PIL later via frombuffer -
+            # no PNG encode here and no PNG decode in the worker
+            mode = ('L' if base_n == 1 else 'RGB') + ('A' if pix.alpha else '')
+            return {'data': pix.samples, 'ext': 'raw', 'mode': mode,
+                    'stride': pix.stride, 'width': pix.width, 'height': pix.height}
+
+        # CMYK and friends: convert to RGB in MuPDF and keep the raw samples -
+        # round-tripping through PNG here only burned an encode plus a decode
+        pix1 = fitz.Pixmap(fitz.csRGB, pix)
+        try:
+            return {'data': pix1.samples, 'ext': 'raw',
+                    'mode': 'RGB' + ('A' if pix1.alpha else ''),
+                    'stride': pix1.stride, 'width': pix1.width, 'height': pix1.height}
+        finally:
+            pix1 = None
+    finally:
+        pix = None
+
+def collect_image_sources(doc):
+    """
+    Snapshot every unique image's original bytes once. The snapshots let
+    successive quality tiers re-encode from pristine data while the working
+    document is updated in place, so no tier has to reopen the document.
+    """
+    sources = {}
+    raw_remaining = _RAW_SNAPSHOT_BUDGET
+    # Walk the xref table once instead of per-page get_images calls -
+    # every image object is visited exactly once no matter how many
+    # pages (or nested XObjects) reference it
+    for xref in range(1, doc.xref_length()):
+        try:
+            if doc.xref_get_key(xref, "Subtype")[1] != "/Image":
+                continue
+            source = _load_image_source(doc, xref, raw_remaining)
+            if source is not None:
+                sources[xref] = source
+                if source['ext'] == 'raw':
+                    raw_remaining -= len(source['data'])
+        except Exception:
+            continue
+    return sources
+
+def _encode_source(source, quality, max_dimension):
+    """
+    Decode one cached source and JPEG-encode it for a tier (worker thread)
+    """
+    try:
+        if source['ext'] == 'raw':
+            # Zero-copy view over the cached pixmap samples
+            pil_image = Image.frombuffer(
+                source['mode'], (source['width'], source['height']),
+                source['data'], "raw", source['mode'], source['stride'], 1)
+        else:
+            pil_image = Image.open(io.BytesIO(source['data']))
+        if source['ext'] == 'jpeg':
+            # Let libjpeg decode at reduced resolution - far cheaper
+            # than a full decode followed by a large downscale
+            pil_image.draft('RGB', (max_dimension, max_dimension))
+        result = recompress_image(pil_image, quality, max_dimension)
+        pil_image.close()
+        return result
+    except Exception:
+        return None
+
+# Image dictionary entries that _apply_image stamps or clears; snapshots
+# record the originals so restores can put them back verbatim
+_IMAGE_DICT_KEYS = ("ColorSpace", "BitsPerComponent", "Decode", "DecodeParms",
+                    "SMask", "Mask", "ImageMask")
+
+def _apply_image(doc, xref, jpeg_bytes, width, height, colorspace="/DeviceRGB"):
+    """
+    Swap an image xref's stream for new JPEG bytes in place and fix up its
+    dictionary. Every page referencing the xref sees the new data without
+    any content-stream rebuild, unlike delete_image/insert_image.
+    """
+    doc.update_stream(xref, jpeg_bytes, compress=False)
+    doc.xref_set_key(xref, "Filter", "/DCTDecode")
+    doc.xref_set_key(xref, "Width", str(width))
+    doc.xref_set_key(xref, "Height", str(height))
+    doc.xref_set_key(xref, "BitsPerComponent", "8")
+    doc.xref_set_key(xref, "ColorSpace", colorspace)
+    # Stale auxiliary entries would make viewers misread the new stream;
+    # ImageMask in particular may not coexist with 8-bit DCT color data
+    for key in ("DecodeParms", "SMask", "Mask", "Decode", "ImageMask"):
+        if doc.xref_get_key(xref, key)[0] != "null":
+            doc.xref_set_key(xref, key, "null")
+
+def _restore_image(doc, xref, source):
+    """
+    Put a snapshotted original JPEG back in place, reinstating the
+    dictionary entries _apply_image would otherwise stamp over with its
+    RGB defaults.
+    """
+    doc.update_stream(xref, source['data'], compress=False)
+    doc.xref_set_key(xref, "Filter", "/DCTDecode")
+    doc.xref_set_key(xref, "Width", str(source['width']))
+    doc.xref_set_key(xref, "Height", str(source['height']))
+    meta = source.get('meta', {})
+    for key in _IMAGE_DICT_KEYS:
+        doc.xref_set_key(xref, key, meta.get(key, "null"))
+
+def apply_quality_tier(doc, sources, quality, max_dimension, modified,
+                       per_image_budget=None, target_size=None):
+    """
+    Re-encode the cached image sources at one (quality, max_dimension) tier
+    and write them into the working document in place. `modified` tracks
+    which xrefs differ from their source across tiers. Images whose stored
+    JPEG already fits the tier and stays under per_image_budget (an even
+    share of the size target) are left alone. When target_size is given,
+    the largest images are processed first and the tier stops as soon as
+    the estimated document size drops below the target. Returns True when
+    the document content changed.
+    """
+    changed = False
+    work = []
+    for xref, source in sources.items():
+        # Already a compact JPEG that fits this tier - leave the original
+        # alone (and put it back if an earlier tier replaced it)
+        if (source['ext'] == 'jpeg'
+                and source['width'] <= max_dimension
+                and source['height'] <= max_dimension
+                and (len(source['data']) < 0.3 * source['width'] * source['height']
+                     or (per_image_budget is not None
+                         and len(source['data']) <= per_image_budget))):
+            if xref in modified:
+                _restore_image(doc, xref, source)
+                modified.discard(xref)
+                changed = True
+            continue
+        work.append((xref, source))
+
+    # Largest sources first: when one or two big images dominate the file,
+    # crushing them is usually enough and the rest can be skipped entirely.
+    # Same-sized images still land next to each other via the secondary key.
+    work.sort(key=lambda item: (-len(item[1]['data']),
+                                item[1]['width'], item[1]['height']))
+
+    # Encode in parallel batches (each image is independent and the
+    # Pillow/libjpeg codecs release the GIL), applying serially on the
+    # main thread after each batch; once the cheap estimate says the tier
+    # has reached the target, the remaining smaller images are left as-is
+    estimated_total = _estimate_size(doc) if target_size is not None else None
+    saved = 0
+    batch_size = max(os.cpu_count() or 4, 4)
+    for start in range(0, len(work), batch_size):
+        batch = work[start:start + batch_size]
+        encoded = _get_executor().map(
+            lambda item: _encode_source(item[1], quality, max_dimension), batch)
+        for (xref, source), result in zip(batch, encoded):
+            if not result:
+                continue
+            data, width, height = result
+            # Re-encode didn't beat the JPEG already stored in the PDF -
+            # pass the original through instead of growing the file
+            if (source['ext'] == 'jpeg'
+                    and source['width'] <= max_dimension
+                    and source['height'] <= max_dimension
+                    and len(data) >= len(source['data'])):
+                if xref in modified:
+                    _restore_image(doc, xref, source)
+                    modified.discard(xref)
+                    changed = True
+                continue
+            try:
+                old_len = len(doc.xref_stream_raw(xref))
+            except Exception:
+                old_len = len(source['data'])
+            try:
+                _apply_image(doc, xref, data, width, height)
+                modified.add(xref)
+                changed = True
+                saved += max(old_len - len(data), 0)
             except Exception:
                 continue
-    
-    result = temp_doc.tobytes(garbage=3, deflate=True)
-    temp_doc.close()
-    return result
+        if (estimated_total is not None
+                and estimated_total - saved <= target_size):
+            break
 
-def force_into_range(pdf_document, min_size, max_size):
+    return changed
+
+def _serialize_working(doc):
     """
-    Aggressively force PDF into the 80KB-100KB range
+    Serialize the persistent working document between search trials.
+    Deliberately no garbage collection, clean pass or object streams:
+    those passes renumber the live document's xref table, which would
+    turn the cached source xrefs stale and make later in-place updates
+    overwrite unrelated objects (page contents included).
+    """
+    return doc.tobytes(deflate=True)
+
+def _repack_candidate(data, min_size):
+    """
+    Final pass over an in-range result: garbage collect and pack into
+    object streams on a fresh document, leaving the working copy
+    untouched. Falls back to the unpacked bytes if packing drops the
+    file below the floor.
     """
     try:
-        # Start with very aggressive settings
-        for quality in [15, 10, 8, 5, 3]:
-            for max_dim in [200, 150, 100, 80]:
-                try:
-                    result = compress_with_settings(pdf_document, quality, max_dim)
-                    size = len(result)
-                    
-                    if min_size <= size <= max_size:
-                        return result
-                    
-                    # If too small, try to add some padding or use less compression
-                    if size < min_size and quality < 20:
-                        result = compress_with_settings(pdf_document, quality + 5, max_dim + 20)
-                        if min_size <= len(result) <= max_size:
-                            return result
-                
-                except Exception:
-                    continue
-        
-        # Last resort: use fallback method
-        return fallback_compression(pdf_document, max_size)
-        
+        doc = fitz.open(stream=data, filetype="pdf")
+        try:
+            packed = doc.tobytes(garbage=4, deflate=True, deflate_images=True,
+                                 deflate_fonts=True, clean=True, linear=False,
+                                 use_objstms=True, compression_effort=100)
+        finally:
+            doc.close()
+        if len(packed) >= min_size:
+            return packed
+        return data
     except Exception:
-        return fallback_compression(pdf_document, max_size)
+        return data
 
-def fallback_compression(pdf_document, target_size):
+def _serialize_candidate(doc, max_size_hint=None):
     """
-    Fallback method using different approach to reach 80-100KB
+    Serialize a trial result. When the cheap xref-table estimate shows the
+    trial is still far over target it can never be the returned file (it is
+    out of range) - its size only steers the search, so a light pass without
+    garbage collection is enough.
     """
+    if max_size_hint and _estimate_size(doc) > 2 * max_size_hint:
+        return doc.tobytes(garbage=1, deflate=True)
+    return doc.tobytes(garbage=4, deflate=True, deflate_images=True,
+                       deflate_fonts=True, clean=True, linear=False,
+                       use_objstms=True, compression_effort=100)
+
+@functools.lru_cache(maxsize=64)
+def _fit_size(width, height, max_dimension):
+    """Target dimensions that fit (width, height) inside a max_dimension box"""
+    ratio = min(max_dimension / width, max_dimension / height)
+    return (int(width * ratio), int(height * ratio))
+
+# Modes the normalization below knows how to turn into 8-bit RGB
+_SUPPORTED_MODES = ('RGB', 'RGBA', 'LA', 'P', 'L', 'CMYK', 'I;16', 'I', 'F', '1')
+
+def recompress_image(pil_image, quality, max_dimension):
+    """
+    Resize, normalize mode and JPEG-encode one image (safe to run in a worker
+    thread - the Pillow/libjpeg codecs release the GIL)
+    """
+    # Filter positively up front instead of letting exotic inputs raise
+    # deep inside the resize/encode path - a traceback per unsupported
+    # image is much costlier than this check
+    if pil_image.mode not in _SUPPORTED_MODES:
+        return None
     try:
-        temp_bytes = pdf_document.tobytes()
-        temp_doc = fitz.open(stream=temp_bytes, filetype="pdf")
-        
-        # Apply watermark removal again just in case
-        temp_doc = remove_watermark(temp_doc)
-        
-        # Very aggressive but safe approach
-        for page_num in range(len(temp_doc)):
-            page = temp_doc[page_num]
-            
-            # Get images and compress them with pixmap operations
-            image_list = page.get_images(full=True)
-            
-            for img in image_list:
+        # Resize maintaining aspect ratio
+        original_size = pil_image.size
+        if original_size[0] > max_dimension or original_size[1] > max_dimension:
+            new_size = _fit_size(original_size[0], original_size[1], max_dimension)
+            # Lanczos only pays off for the larger targets at decent
+            # quality - tiny outputs get quantized so hard that its extra
+            # sub-pixel accuracy is invisible, and bilinear is ~9x cheaper
+            if quality >= 25 and max_dimension >= 400:
+                resample = Image.Resampling.LANCZOS
+            else:
+                resample = Image.Resampling.BILINEAR
+            # Pre-shrink by an integer factor with reduce() - a SIMD box
+            # filter - so the convolution kernel only handles the final
+            # ~2x step. Explicit control replaces the earlier reducing_gap
+            # hint and also covers non-JPEG sources that draft() can't help.
+            k = max(1, min(original_size[0] // new_size[0],
+                           original_size[1] // new_size[1]) // 2)
+            if k > 1 and pil_image.mode not in ('P', '1'):
+                # (palette/bilevel images average incorrectly under a box
+                # filter, so they go straight to the full resize)
+                pil_image = pil_image.reduce(k)
+            pil_image = pil_image.resize(new_size, resample)
+
+        # Handle transparency
+        if pil_image.mode in ('RGBA', 'LA'):
+            # getextrema is a single cheap scan; a fully opaque alpha
+            # channel (common in PDF rasters) needs no composite at all
+            if pil_image.getchannel('A').getextrema() == (255, 255):
+                pil_image = pil_image.convert('RGB')
+            else:
+                # Vectorized white composite - one SIMD multiply/add over
+                # the whole array instead of PIL's per-pixel paste(mask=)
+                if pil_image.mode == 'LA':
+                    pil_image = pil_image.convert('RGBA')
+                arr = _np.asarray(pil_image)
+                alpha = arr[..., 3:].astype(_np.float32) * (1.0 / 255.0)
+                rgb = arr[..., :3].astype(_np.float32)
+                composited = rgb * alpha + 255.0 * (1.0 - alpha)
+                pil_image = Image.fromarray(composited.astype(_np.uint8), 'RGB')
+        elif pil_image.mode in ('I;16', 'I', 'F'):
+            # 16/32-bit channels: scale down to 8 bit explicitly - Pillow's
+            # JPEG encoder can't take these directly, and halving the pixel
+            # bytes speeds up every later step
+            pil_image = pil_image.point(lambda v: v * (1 / 256)).convert('L').convert('RGB')
+        elif pil_image.mode == 'CMYK':
+            pil_image = pil_image.convert('RGB')
+
+        if pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
+
+        # Compress image
+        width, height = pil_image.size
+        return encode_jpeg(pil_image, quality), width, height
+    except Exception:
+        return None
+
+def compress_with_settings(base_bytes, quality, max_dimension, max_size_hint=None):
+    """
+    Compress PDF with specific quality and dimension settings
+    """
+    temp_doc = fitz.open(stream=base_bytes, filetype="pdf")
+    try:
+        sources = collect_image_sources(temp_doc)
+        changed = apply_quality_tier(temp_doc, sources, quality, max_dimension, set())
+        # Nothing was replaced - the serialized result would be the base
+        # bytes again, so skip the O(N) tobytes entirely
+        if not changed:
+            return base_bytes
+        return _serialize_candidate(temp_doc, max_size_hint)
+    finally:
+        temp_doc.close()
+        # Each trial decodes its images afresh; keep the store from
+        # accumulating them across force_into_range's many trials
+        fitz.TOOLS.store_shrink(100)
+
+def _native_trial(base_bytes, quality, max_dimension, max_size_hint=None):
+    """
+    MuPDF-native variant of compress_with_settings for the aggressive grid:
+    images are halved in C with Pixmap.shrink (a box filter) until they fit
+    the dimension cap and JPEG-encoded straight from the pixmap. At
+    thumbnail sizes the box filter is visually equivalent to a kernel
+    resample and the whole trial skips the PIL decode/resize/encode stack.
+    """
+    temp_doc = fitz.open(stream=base_bytes, filetype="pdf")
+    try:
+        changed = False
+        for xref in range(1, temp_doc.xref_length()):
+            try:
+                if temp_doc.xref_get_key(xref, "Subtype")[1] != "/Image":
+                    continue
+                pix = fitz.Pixmap(temp_doc, xref)
+                work = None
                 try:
-                    xref = img[0]
-                    
-                    # Use pixmap for safer image handling
-                    base_pix = fitz.Pixmap(temp_doc, xref)
-                    
-                    # Skip tiny images
-                    if base_pix.width < 50 or base_pix.height < 50:
-                        base_pix = None
+                    if pix.width * pix.height < 5000:
                         continue
-                    
-                    # Scale down significantly
-                    mat = fitz.Matrix(0.5, 0.5)  # 50% scale
-                    small_pix = fitz.Pixmap(base_pix, mat)
-                    base_pix = None
-                    
-                    # Convert to JPEG bytes
-                    if small_pix.n > 4:  # CMYK
-                        rgb_pix = fitz.Pixmap(fitz.csRGB, small_pix)
-                        small_pix = None
-                        jpeg_data = rgb_pix.tobytes("jpeg", jpg_quality=20)
-                        rgb_pix = None
-                    else:
-                        jpeg_data = small_pix.tobytes("jpeg", jpg_quality=20)
-                        small_pix = None
-                    
-                    # Replace using update_stream (last resort)
-                    temp_doc.update_stream(xref, jpeg_data)
-                    
+                    # Halvings until one more would undershoot the cap -
+                    # the result lands within [max_dimension, 2x) which is
+                    # plenty precise for the last-resort pass
+                    k = 0
+                    while max(pix.width, pix.height) >> (k + 1) >= max_dimension:
+                        k += 1
+                    if k:
+                        pix.shrink(k)
+                    work = pix
+                    if work.n - work.alpha not in (1, 3):
+                        work = fitz.Pixmap(fitz.csRGB, work)
+                    if work.alpha:
+                        work = fitz.Pixmap(work, 0)
+                    jpeg_bytes = work.tobytes("jpeg", jpg_quality=quality)
+                    colorspace = "/DeviceGray" if work.n == 1 else "/DeviceRGB"
+                    width, height = work.width, work.height
+                finally:
+                    work = None
+                    pix = None
+                _apply_image(temp_doc, xref, jpeg_bytes, width, height, colorspace)
+                changed = True
+            except Exception:
+                continue
+        if not changed:
+            return base_bytes
+        return _serialize_candidate(temp_doc, max_size_hint)
+    finally:
+        temp_doc.close()
+        fitz.TOOLS.store_shrink(100)
+
+def force_into_range(base_bytes, min_size, max_size):
+    """
+    Aggressively force PDF into the 80KB-100KB range. Returns the smallest
+    result achieved when no combination lands in range.
+    """
+    best = base_bytes
+    # Order the grid by an aggressiveness proxy - quality x dim^2 tracks
+    # JPEG output size - and walk it gentlest-first, down to thumbnail
+    # scale (the last combinations cover what the old fallback pass did)
+    combos = sorted(((q, d) for q in [15, 10, 8, 5, 3]
+                     for d in [200, 150, 100, 80, 60]),
+                    key=lambda qd: -qd[0] * qd[1] * qd[1])
+    try:
+        for quality, max_dim in combos:
+            try:
+                result = _native_trial(base_bytes, quality, max_dim,
+                                       max_size_hint=max_size)
+            except Exception:
+                result = None
+            if result is None or result is base_bytes:
+                # The native pass couldn't touch anything (decode failure
+                # or exotic images) - retry the trial through the PIL path
+                try:
+                    result = compress_with_settings(base_bytes, quality, max_dim,
+                                                    max_size_hint=max_size)
                 except Exception:
                     continue
-        
-        result = temp_doc.tobytes(garbage=4, deflate=True)
-        temp_doc.close()
-        return result
-        
+            size = len(result)
+
+            if min_size <= size <= max_size:
+                return result
+
+            if size < len(best):
+                best = result
+
+            if size <= max_size:
+                # Under the ceiling but below the floor: every remaining
+                # combo is more aggressive and lands even lower, so stop
+                break
+
+        return best
+
     except Exception:
-        # Return original if all else fails
-        return pdf_document.tobytes()
+        return best
+
+# Unit magnitude comes from bit_length: every 10 bits is one 1024 step
+_SIZE_UNITS = ("B", "KB", "MB", "GB")
+_SIZE_DIVS = (1, 1024, 1024 ** 2, 1024 ** 3)
 
 def format_file_size(size_bytes):
     """Convert bytes to human readable format"""
-    if size_bytes == 0:
-        return "0B"
-    size_names = ["B", "KB", "MB"]
-    import math
-    i = int(math.floor(math.log(size_bytes, 1024)))
-    p = math.pow(1024, i)
-    s = round(size_bytes / p, 1)
-    return f"{s} {size_names[i]}"
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    i = min((size_bytes.bit_length() - 1) // 10, len(_SIZE_DIVS) - 1)
+    return f"{size_bytes / _SIZE_DIVS[i]:.1f} {_SIZE_UNITS[i]}"
 
 def main():
     st.set_page_config(
@@ -410,8 +989,9 @@ def main():
     )
     
     if uploaded_file is not None:
-        # Show file info
-        original_size = len(uploaded_file.getvalue())
+        # Show file info - the upload buffer already knows its size, no
+        # need to materialize a bytes copy just to measure it
+        original_size = uploaded_file.size
         
         col1, col2 = st.columns(2)
         with col1:
@@ -434,26 +1014,24 @@ def main():
                 try:
                     # Read file
                     input_bytes = uploaded_file.getvalue()
-                    status_text.text("📖 Analyzing PDF structure...")
-                    progress_bar.progress(20)
-                    
-                    status_text.text("🖼️ Processing images safely...")
-                    progress_bar.progress(40)
-                    
-                    status_text.text("📐 Maintaining layout...")
-                    progress_bar.progress(60)
-                    
-                    status_text.text("⚡ Optimizing compression...")
-                    progress_bar.progress(80)
-                    
-                    status_text.text("🎯 Finalizing...")
-                    progress_bar.progress(90)
-                    
+
+                    # A single initial update, then real per-stage events from
+                    # the pipeline - each progress call is a frontend round-trip,
+                    # so fake pacing just slows small files down
+                    def update_progress(percent, message):
+                        progress_bar.progress(percent)
+                        status_text.text(message)
+
+                    update_progress(10, "📖 Analyzing PDF structure...")
+
                     # Compress
-                    compressed_bytes = compress_pdf_to_100kb(input_bytes)
-                    
-                    progress_bar.progress(100)
-                    status_text.text("✅ Compression complete!")
+                    compressed_bytes, compress_error = compress_pdf_to_100kb(
+                        input_bytes, _progress=update_progress)
+                    # The pipeline is done with the upload - release our
+                    # copy so only Streamlit's own buffer remains resident
+                    input_bytes = None
+
+                    update_progress(100, "✅ Compression complete!")
                     
                     if compressed_bytes:
                         compressed_size = len(compressed_bytes)
@@ -548,11 +1126,9 @@ def main():
                             else:
                                 st.write(f"⚠️ **Range Status:** Outside target (80KB-100KB)")
                         
-                        # Memory cleanup
-                        del compressed_bytes
-                        gc.collect()
-                        
                     else:
+                        if compress_error:
+                            st.error(f"❌ **{compress_error}**")
                         st.error("❌ **Compression failed.** Please try with a different PDF file.")
                         
                 except Exception as e: